@@ -0,0 +1,152 @@
+"""
+The arrow module builds Apache Arrow schemas for the 3DBAG layers from the attribute
+specifications, and writes record batches to GeoParquet files. Requires pyarrow.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from bag3d.specs.core import Attribute, load_attributes_spec
+from bag3d.specs.readers import Location
+
+GEOPARQUET_VERSION = "1.1.0"
+
+
+def layer_schema(
+    location: Location,
+    attributes: Optional[Dict[str, Attribute]] = None,
+    geometry_column: Optional[str] = "geometry",
+) -> pa.Schema:
+    """Return the Arrow schema of the attributes that are present in a location.
+
+    Args:
+        location: The layer, for example GpkgLocation.pand.
+        attributes: The attribute specifications. Defaults to the packaged specs.
+        geometry_column: The name of the WKB geometry column that is appended to the
+            attributes, or None for a schema without geometry.
+    """
+    if attributes is None:
+        attributes = load_attributes_spec()
+    fields = [
+        attribute.as_arrow_field()
+        for attribute in attributes.values()
+        if location in attribute.applies_to.locations()
+    ]
+    if geometry_column is not None:
+        fields.append(pa.field(geometry_column, pa.binary()))
+    return pa.schema(fields)
+
+
+def geoparquet_metadata(
+    geometry_column: str = "geometry",
+    geometry_types: Optional[List[str]] = None,
+    crs: Optional[dict] = None,
+) -> dict:
+    """Return the GeoParquet 'geo' file metadata for a WKB geometry column.
+
+    Args:
+        geometry_column: The name of the geometry column.
+        geometry_types: The geometry types in the column, eg. ["MultiPolygon Z"].
+            An empty list means that the types are unknown.
+        crs: The coordinate reference system as PROJJSON. If None, the CRS is written
+            as unknown, because GeoParquet readers assume OGC:CRS84 if it is omitted.
+
+    References:
+        - GeoParquet specification: https://geoparquet.org/releases/v1.1.0/
+    """
+    return {
+        "version": GEOPARQUET_VERSION,
+        "primary_column": geometry_column,
+        "columns": {
+            geometry_column: {
+                "encoding": "WKB",
+                "geometry_types": geometry_types or [],
+                "crs": crs,
+            }
+        },
+    }
+
+
+def write_geoparquet(
+    batches: Iterable[pa.RecordBatch],
+    path: Path,
+    schema: pa.Schema,
+    row_group_size: int = 128 * 1024,
+    geometry_column: str = "geometry",
+    geometry_types: Optional[List[str]] = None,
+    crs: Optional[dict] = None,
+    compression: str = "zstd",
+) -> int:
+    """Write record batches to a GeoParquet file.
+
+    Each batch is checked and cast to the schema as it arrives, so that the batches
+    may have different, eg. inferred, types. The cast batches are buffered until a
+    full row group is collected, so that the row groups have the same size regardless
+    of the size of the batches. Each row group can be read in parallel. Besides the
+    batch that is being written, less than one row group of rows is buffered. A batch
+    that is larger than a row group is held in memory as a whole while it is split
+    into row groups.
+
+    Args:
+        batches: The record batches, with at least the columns of the schema. The
+            columns of each batch are cast to the schema, eg. strings to dictionaries
+            and all-null columns to the type of the field.
+        path: Path to the output file.
+        schema: The schema of the file, see layer_schema.
+        row_group_size: The number of rows per row group.
+        geometry_column: The name of the WKB geometry column.
+        geometry_types: The geometry types in the geometry column.
+        crs: The coordinate reference system as PROJJSON.
+        compression: The Parquet compression codec.
+
+    Returns:
+        The number of rows written.
+
+    Raises:
+        ValueError: If a column that is not nullable in the schema contains a null.
+    """
+    geo = geoparquet_metadata(geometry_column, geometry_types, crs)
+    schema = schema.with_metadata(
+        {**(schema.metadata or {}), b"geo": json.dumps(geo).encode("utf-8")}
+    )
+    not_nullable = [f.name for f in schema if not f.nullable]
+    n_rows = 0
+
+    def cast(batch: pa.RecordBatch) -> pa.Table:
+        table = pa.Table.from_batches([batch]).select(schema.names)
+        for name in not_nullable:
+            column = table.column(name)
+            if column.null_count > 0:
+                row = pc.index(pc.is_null(column), True).as_py()
+                identificatie = (
+                    table.column("identificatie")[row].as_py()
+                    if "identificatie" in table.column_names
+                    else None
+                )
+                raise ValueError(
+                    f"{path}: the column '{name}' is not nullable, but row "
+                    f"{n_rows + row} (identificatie {identificatie}) is null"
+                )
+        return table.cast(schema)
+
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        buffer: List[pa.Table] = []
+        buffered = 0
+        for batch in batches:
+            buffer.append(cast(batch))
+            buffered += batch.num_rows
+            n_rows += batch.num_rows
+            if buffered >= row_group_size:
+                table = pa.concat_tables(buffer)
+                full = buffered - buffered % row_group_size
+                writer.write_table(table.slice(0, full), row_group_size=row_group_size)
+                buffer = [table.slice(full)]
+                buffered -= full
+        if buffered > 0:
+            writer.write_table(pa.concat_tables(buffer), row_group_size=row_group_size)
+    return n_rows
@@ -0,0 +1,340 @@
+"""
+The changefeed module computes which buildings were added, removed or modified between
+two 3DBAG releases, and which attributes were modified.
+
+The releases are compared tile by tile, in parallel. For each building, the values of
+the specified attributes are normalized (see normalize_value) and hashed, so that
+float noise below the precision of an attribute is not reported as a change. The
+added and removed buildings are spilled to hash partitions on disk, and matched per
+partition after all tiles are compared, to find the buildings that moved to a
+different tile.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import StrEnum
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bag3d.specs.core import Attribute, GpkgLocation, load_attributes_spec
+from bag3d.specs.readers import (
+    BUILDING_LOCATIONS,
+    Location,
+    iter_files,
+    partition_of,
+    read_gpkg,
+    read_records,
+)
+from bag3d.specs.values import normalize_value
+
+Digests = Dict[str, bytes]
+"""The hash of the normalized value per attribute name of a building."""
+
+
+class ChangeType(StrEnum):
+    """The type of change of a building between two releases."""
+
+    added = "added"
+    removed = "removed"
+    modified = "modified"
+
+
+@dataclass
+class Change:
+    """A building that changed between two releases.
+
+    Attributes:
+        identificatie: str
+        change: ChangeType
+        tile: str. The tile of the building, in the new release unless it was removed.
+        attributes: List[str]. The modified attributes, empty unless it was modified.
+    """
+
+    identificatie: str
+    change: ChangeType
+    tile: str
+    attributes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "identificatie": self.identificatie,
+            "change": str(self.change),
+            "tile": self.tile,
+            "attributes": self.attributes,
+        }
+
+
+def _digest(value) -> bytes:
+    """Hash a normalized value."""
+    data = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _row_hash(digests: Digests) -> bytes:
+    """Hash all attribute values of a building."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(digests):
+        h.update(name.encode("utf-8"))
+        h.update(digests[name])
+    return h.digest()
+
+
+def _read_tile(
+    path: Optional[str], attributes: Dict[str, Attribute]
+) -> Dict[str, Tuple[bytes, Digests]]:
+    """Return the row hash and the attribute digests per building of a tile."""
+    buildings = {}
+    if path is None:
+        return buildings
+    if Path(path).suffix.lower() == ".gpkg":
+        # Only the pand layer has one record per building, skip the other layers
+        records = read_gpkg(Path(path), attributes, layers=(GpkgLocation.pand,))
+    else:
+        records = read_records(Path(path), attributes)
+    hashed: Dict[Location, List[Tuple[str, Attribute]]] = {}
+    for record in records:
+        if record.location not in BUILDING_LOCATIONS or record.identificatie is None:
+            continue
+        if record.identificatie in buildings:
+            continue
+        if record.location not in hashed:
+            hashed[record.location] = [
+                (name, attribute)
+                for name, attribute in attributes.items()
+                if name != "identificatie"
+                and record.location in attribute.applies_to.locations()
+            ]
+        digests = {
+            name: _digest(normalize_value(attribute, record.attributes.get(name)))
+            for name, attribute in hashed[record.location]
+        }
+        buildings[record.identificatie] = (_row_hash(digests), digests)
+    return buildings
+
+
+def _changed_attributes(old: Digests, new: Digests) -> List[str]:
+    """Return the names of the attributes with a different digest."""
+    return sorted(
+        name for name in old.keys() | new.keys() if old.get(name) != new.get(name)
+    )
+
+
+def _spill(
+    partitions_dir: str,
+    n_partitions: int,
+    change: ChangeType,
+    tile: str,
+    buildings: Dict[str, Digests],
+) -> None:
+    """Append the added or removed buildings of a tile to the partition files.
+
+    Each worker process appends to its own file per partition, so that the files are
+    not written concurrently and their number does not grow with the number of tiles.
+    """
+    lines: Dict[int, List[str]] = {}
+    for identificatie, digests in buildings.items():
+        line = json.dumps(
+            [
+                str(change),
+                identificatie,
+                tile,
+                {name: digest.hex() for name, digest in digests.items()},
+            ]
+        )
+        lines.setdefault(partition_of(identificatie, n_partitions), []).append(line)
+    for partition, partition_lines in lines.items():
+        path = Path(partitions_dir) / str(partition) / f"{os.getpid()}.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(partition_lines) + "\n")
+
+
+def _diff_tile(
+    tile: str,
+    old_path: Optional[str],
+    new_path: Optional[str],
+    partitions_dir: str,
+    n_partitions: int,
+) -> List[Change]:
+    """Compare the buildings of a tile between two releases.
+
+    Returns the modified buildings. The added and removed buildings are written to
+    the partition files, because they can have moved to or from another tile.
+    """
+    attributes = load_attributes_spec()
+    old = _read_tile(old_path, attributes)
+    new = _read_tile(new_path, attributes)
+    modified = []
+    added = {}
+    for identificatie, (row_hash, digests) in new.items():
+        if identificatie not in old:
+            added[identificatie] = digests
+            continue
+        old_row_hash, old_digests = old.pop(identificatie)
+        if row_hash != old_row_hash:
+            modified.append(
+                Change(
+                    identificatie,
+                    ChangeType.modified,
+                    tile,
+                    _changed_attributes(old_digests, digests),
+                )
+            )
+    removed = {identificatie: digests for identificatie, (_, digests) in old.items()}
+    _spill(partitions_dir, n_partitions, ChangeType.added, tile, added)
+    _spill(partitions_dir, n_partitions, ChangeType.removed, tile, removed)
+    return modified
+
+
+def _match_partition(partition_dir: str) -> List[Change]:
+    """Match the added and removed buildings of a partition on their identificatie,
+    to find the buildings that moved to another tile."""
+    added: Dict[str, Tuple[str, dict]] = {}
+    removed: Dict[str, Tuple[str, dict]] = {}
+    for path in sorted(Path(partition_dir).glob("*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                change, identificatie, tile, digests = json.loads(line)
+                target = added if change == ChangeType.added else removed
+                target[identificatie] = (tile, digests)
+
+    changes = []
+    for identificatie in sorted(added.keys() | removed.keys()):
+        if identificatie not in removed:
+            tile, _ = added[identificatie]
+            changes.append(Change(identificatie, ChangeType.added, tile))
+        elif identificatie not in added:
+            tile, _ = removed[identificatie]
+            changes.append(Change(identificatie, ChangeType.removed, tile))
+        else:
+            _, old_digests = removed[identificatie]
+            tile, new_digests = added[identificatie]
+            if changed := _changed_attributes(old_digests, new_digests):
+                changes.append(
+                    Change(identificatie, ChangeType.modified, tile, changed)
+                )
+    return changes
+
+
+def _tile_files(release: Path) -> Dict[str, Path]:
+    """Return the tile files of a release by their path relative to the release."""
+    release = Path(release)
+    return {
+        str(path.relative_to(release)): path
+        for path in iter_files(release)
+        if path.suffix.lower() != ".glb"
+    }
+
+
+def changefeed(
+    old_release: Path,
+    new_release: Path,
+    scratch_dir: Path,
+    n_partitions: int = 64,
+    max_workers: Optional[int] = None,
+) -> Iterator[Change]:
+    """Compute the changes of the buildings between two releases.
+
+    The tile files of the releases (GeoPackage or CityJSONSeq) are paired by their
+    path relative to the release directory. The modified buildings are yielded as soon
+    as their tile is compared. The added and removed buildings are scattered to
+    partition files on disk by the hash of their identificatie, because a building can
+    move to another tile. After all tiles are compared, each partition is matched in a
+    separate process, so that at most one partition is held in memory per process.
+
+    Args:
+        old_release: Directory with the tile files of the old release.
+        new_release: Directory with the tile files of the new release.
+        scratch_dir: Directory for the partition files.
+        n_partitions: The number of partitions of the added and removed buildings.
+        max_workers: The number of worker processes. Defaults to the CPU count. At
+            most twice this many tiles are in progress at a time.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    old_files = _tile_files(old_release)
+    new_files = _tile_files(new_release)
+    tiles = iter(sorted(old_files.keys() | new_files.keys()))
+    for p in range(n_partitions):
+        (Path(scratch_dir) / str(p)).mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        while True:
+            for tile in tiles:
+                old_path, new_path = old_files.get(tile), new_files.get(tile)
+                pending.add(
+                    pool.submit(
+                        _diff_tile,
+                        tile,
+                        str(old_path) if old_path else None,
+                        str(new_path) if new_path else None,
+                        str(scratch_dir),
+                        n_partitions,
+                    )
+                )
+                if len(pending) >= 2 * max_workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+        for changes in pool.map(
+            _match_partition,
+            [str(Path(scratch_dir) / str(p)) for p in range(n_partitions)],
+        ):
+            yield from changes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the building attribute changes between two releases"
+    )
+    parser.add_argument(
+        "--old", required=True, help="Directory with the tiles of the old release"
+    )
+    parser.add_argument(
+        "--new", required=True, help="Directory with the tiles of the new release"
+    )
+    parser.add_argument(
+        "--output", "-o", help="Path to the output JSON Lines file. Default: stdout"
+    )
+    parser.add_argument(
+        "--partitions", type=int, default=64, help="Number of hash partitions"
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--scratch", help="Directory for the partition files")
+
+    args = parser.parse_args()
+
+    counts = {change_type: 0 for change_type in ChangeType}
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with tempfile.TemporaryDirectory(dir=args.scratch) as scratch_dir:
+            for change in changefeed(
+                Path(args.old),
+                Path(args.new),
+                Path(scratch_dir),
+                n_partitions=args.partitions,
+                max_workers=args.workers,
+            ):
+                counts[change.change] += 1
+                output.write(json.dumps(change.to_dict()) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        ", ".join(f"{count} {change_type}" for change_type, count in counts.items()),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+The consistency module checks whether the same building has the same attribute
+values in the different distributed formats (CityJSON, GeoPackage, 3D Tiles).
+
+The records of all formats are joined on the identificatie of the building with a
+partitioned hash join. First, the records are streamed from the files and scattered
+to partition files on disk by the hash of their identificatie. Then each partition is
+joined and compared in a separate process, so that at most one partition is held in
+memory per process. For each attribute, the values are compared between each pair of
+locations where the attribute is specified (see AttributeAppliesTo). Only the
+locations with one record per building are compared (see BUILDING_LOCATIONS).
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bag3d.specs.core import (
+    Attribute,
+    Cesium3dTilesLocation,
+    CityJSONLocation,
+    GpkgLocation,
+    load_attributes_spec,
+)
+from bag3d.specs.readers import (
+    BUILDING_LOCATIONS,
+    Location,
+    iter_files,
+    partition_of,
+    read_gpkg,
+    read_records,
+)
+from bag3d.specs.values import values_equal
+
+
+def location_key(location: Location) -> str:
+    """Return a key that identifies the location across formats.
+
+    >>> location_key(GpkgLocation.pand)
+    'gpkg:pand'
+    """
+    if isinstance(location, CityJSONLocation):
+        return f"cityjson:{location.value}"
+    if isinstance(location, GpkgLocation):
+        return f"gpkg:{location.value}"
+    return f"cesium3dtiles:{location.value}"
+
+
+@dataclass
+class Source:
+    """A file or directory with records in one of the distributed formats.
+
+    Attributes:
+        path: Path
+        location: Optional[Cesium3dTilesLocation]. Required for 3D Tiles content.
+    """
+
+    path: Path
+    location: Optional[Cesium3dTilesLocation] = None
+
+
+PairKey = Tuple[str, str, str]
+"""Attribute name and the keys of the two locations that are compared."""
+
+
+@dataclass
+class ConsistencyReport:
+    """The result of a consistency check.
+
+    Attributes:
+        compared: Counter. The number of buildings that are compared per attribute
+            and pair of locations.
+        mismatches: Counter. The number of buildings with a different value per
+            attribute and pair of locations.
+        examples: Dict[PairKey, List[Tuple[str, Any, Any]]]. A few mismatching
+            identificatie and values per attribute and pair of locations.
+    """
+
+    compared: Counter = field(default_factory=Counter)
+    mismatches: Counter = field(default_factory=Counter)
+    examples: Dict[PairKey, list] = field(default_factory=dict)
+
+    def update(self, other: "ConsistencyReport", max_examples: int = 3) -> None:
+        """Merge the results of another (partition) report into this report."""
+        self.compared.update(other.compared)
+        self.mismatches.update(other.mismatches)
+        for key, examples in other.examples.items():
+            existing = self.examples.setdefault(key, [])
+            existing.extend(examples[: max_examples - len(existing)])
+
+
+def _scatter(
+    task_index: int,
+    files: List[Tuple[Path, Optional[Cesium3dTilesLocation]]],
+    partitions_dir: str,
+    n_partitions: int,
+) -> None:
+    """Stream the records of the files and write them to the partition files."""
+    attributes = load_attributes_spec()
+    applies_to = {
+        name: set(attribute.applies_to.locations())
+        for name, attribute in attributes.items()
+    }
+    partition_files = [
+        open(
+            Path(partitions_dir) / str(p) / f"{task_index}.jsonl",
+            "w",
+            encoding="utf-8",
+        )
+        for p in range(n_partitions)
+    ]
+    try:
+        for path, location in files:
+            if path.suffix.lower() == ".gpkg":
+                # Skip the lod* layers, they are the largest and are not compared
+                records = read_gpkg(path, attributes, layers=(GpkgLocation.pand,))
+            else:
+                records = read_records(path, attributes, location)
+            for record in records:
+                if record.location not in BUILDING_LOCATIONS:
+                    continue
+                if record.identificatie is None:
+                    continue
+                values = {
+                    name: value
+                    for name, value in record.attributes.items()
+                    if record.location in applies_to.get(name, ())
+                }
+                line = json.dumps(
+                    [location_key(record.location), record.identificatie, values],
+                    default=str,
+                )
+                partition = partition_of(record.identificatie, n_partitions)
+                partition_files[partition].write(line + "\n")
+    finally:
+        for f in partition_files:
+            f.close()
+
+
+def _comparisons(
+    attributes: Dict[str, Attribute],
+) -> List[Tuple[Attribute, str, str]]:
+    """Return the attribute and pairs of location keys that need to be compared."""
+    comparisons = []
+    for attribute in attributes.values():
+        keys = sorted(
+            location_key(location)
+            for location in attribute.applies_to.locations()
+            if location in BUILDING_LOCATIONS
+        )
+        for a, b in combinations(keys, 2):
+            comparisons.append((attribute, a, b))
+    return comparisons
+
+
+def _join(partition_dir: str, max_examples: int) -> ConsistencyReport:
+    """Join the records of a partition on their identificatie and compare them."""
+    attributes = load_attributes_spec()
+    buildings: Dict[str, Dict[str, dict]] = {}
+    for path in sorted(Path(partition_dir).glob("*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, identificatie, values = json.loads(line)
+                # Keep the first record if a building is present more than once
+                buildings.setdefault(identificatie, {}).setdefault(key, values)
+
+    report = ConsistencyReport()
+    comparisons = _comparisons(attributes)
+    for identificatie, records in buildings.items():
+        for attribute, a, b in comparisons:
+            if a not in records or b not in records:
+                continue
+            value_a = records[a].get(attribute.name)
+            value_b = records[b].get(attribute.name)
+            pair = (attribute.name, a, b)
+            report.compared[pair] += 1
+            if not values_equal(attribute, value_a, value_b):
+                report.mismatches[pair] += 1
+                examples = report.examples.setdefault(pair, [])
+                if len(examples) < max_examples:
+                    examples.append((identificatie, value_a, value_b))
+    return report
+
+
+def check_consistency(
+    sources: Iterable[Source],
+    scratch_dir: Path,
+    n_partitions: int = 64,
+    max_workers: Optional[int] = None,
+    max_examples: int = 3,
+) -> ConsistencyReport:
+    """Compare the attribute values of the buildings across the sources.
+
+    Args:
+        sources: The files or directories to compare.
+        scratch_dir: Directory for the partition files.
+        n_partitions: The number of partitions. The memory use of a worker is about
+            the size of the data divided by the number of partitions.
+        max_workers: The number of worker processes. Defaults to the CPU count.
+        max_examples: The number of mismatch examples to keep per attribute and pair
+            of locations.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    files = [
+        (path, source.location)
+        for source in sources
+        for path in iter_files(source.path)
+    ]
+    for p in range(n_partitions):
+        (Path(scratch_dir) / str(p)).mkdir(parents=True, exist_ok=True)
+
+    report = ConsistencyReport()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        # Each task scatters an interleaved share of the files, so that the number
+        # of partition files does not grow with the number of input files
+        scattered = [
+            pool.submit(
+                _scatter, i, files[i::max_workers], str(scratch_dir), n_partitions
+            )
+            for i in range(min(max_workers, len(files)))
+        ]
+        for future in scattered:
+            future.result()
+        joined = pool.map(
+            _join,
+            [str(Path(scratch_dir) / str(p)) for p in range(n_partitions)],
+            [max_examples] * n_partitions,
+        )
+        for partition_report in joined:
+            report.update(partition_report, max_examples)
+    return report
+
+
+def _parse_3dtiles_source(value: str) -> Source:
+    """Parse a LOCATION=PATH argument."""
+    location, _, path = value.partition("=")
+    if not path:
+        raise argparse.ArgumentTypeError(
+            f"Expected LOCATION=PATH, for example lod22=tiles/lod22, got {value}"
+        )
+    return Source(Path(path), Cesium3dTilesLocation.from_string(location))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the attribute values of buildings across formats"
+    )
+    parser.add_argument(
+        "--cityjson",
+        nargs="*",
+        default=[],
+        help="CityJSON or CityJSONSeq files or directories",
+    )
+    parser.add_argument(
+        "--gpkg", nargs="*", default=[], help="GeoPackage files or directories"
+    )
+    parser.add_argument(
+        "--3dtiles",
+        dest="cesium3dtiles",
+        nargs="*",
+        default=[],
+        type=_parse_3dtiles_source,
+        help="3D Tiles content directories as LOCATION=PATH, eg. lod22=tiles/lod22",
+    )
+    parser.add_argument(
+        "--partitions", type=int, default=64, help="Number of hash partitions"
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--scratch", help="Directory for the partition files")
+
+    args = parser.parse_args()
+    sources = (
+        [Source(Path(p)) for p in args.cityjson]
+        + [Source(Path(p)) for p in args.gpkg]
+        + args.cesium3dtiles
+    )
+
+    with tempfile.TemporaryDirectory(dir=args.scratch) as scratch_dir:
+        report = check_consistency(
+            sources,
+            Path(scratch_dir),
+            n_partitions=args.partitions,
+            max_workers=args.workers,
+        )
+
+    print("attribute\tlocation_a\tlocation_b\tcompared\tmismatches")
+    for pair in sorted(report.compared):
+        name, a, b = pair
+        print(f"{name}\t{a}\t{b}\t{report.compared[pair]}\t{report.mismatches[pair]}")
+    for pair, examples in sorted(report.examples.items()):
+        name, a, b = pair
+        print(f"❌ {name} differs between {a} and {b}, for example:", file=sys.stderr)
+        for identificatie, value_a, value_b in examples:
+            print(f"   {identificatie}: {value_a!r} != {value_b!r}", file=sys.stderr)
+    if report.mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 The core module defines the core data model for 3DBAG attribute specifications: enums
 for base types and locations (CityJSON, GeoPackage, Cesium 3D Tiles), dataclasses for
 types, translations, array items, and attributes, utilities to map types to
-JSON/Python/GPKG/OGR/Geoflow, and loaders for the packaged attribute specs and schema.
+JSON/Python/GPKG/OGR/Geoflow/Arrow, and loaders for the packaged attribute specs and
+schema.
 """
 
 from enum import Enum, StrEnum, auto
@@ -169,6 +170,28 @@ class AttributeType:
         }
         return mapping[self.base_type.name]
 
+    def as_arrow(self):
+        """Convert to Apache Arrow data type. Requires pyarrow.
+
+        Arrays without an item type are mapped to a list of strings.
+        """
+        import pyarrow as pa
+
+        mapping = {
+            "INT": pa.int64(),
+            "FLOAT": pa.float64(),
+            "BOOL": pa.bool_(),
+            "STRING": pa.string(),
+            "DATE": pa.date32(),
+            "DATETIME": pa.timestamp("ms"),
+            "NULL": pa.null(),
+        }
+        if self.base_type == BaseType.ARRAY:
+            if self.sub_type is None:
+                return pa.list_(pa.string())
+            return pa.list_(mapping[self.sub_type.name])
+        return mapping[self.base_type.name]
+
 
 class CityJSONLocation(StrEnum):
     """The object type where the attribute is located in CityJSON.
@@ -318,6 +341,16 @@ class AttributeAppliesTo:
             }
         return cls(cityjson=cityjson, gpkg=gpkg, cesium3dtiles=cesium3dtiles)
 
+    def locations(
+        self,
+    ) -> list[CityJSONLocation | GpkgLocation | Cesium3dTilesLocation]:
+        """Return the locations in all formats where the attribute is present."""
+        locations = []
+        for applies_to in (self.cityjson, self.gpkg, self.cesium3dtiles):
+            if applies_to is not None:
+                locations.extend(applies_to["locations"])
+        return locations
+
 
 class DocumentationLanguage(Enum):
     EN = auto()
@@ -366,7 +399,7 @@ class ArrayItemDefinition:
     def from_dict(cls, data: Dict[str, Any]) -> "ArrayItemDefinition":
         """Create ArrayItemDefinition from dictionary."""
         return cls(
-            type=AttributeType(data["type"]),
+            type=AttributeType.from_dict(data),
             semantic_type=data.get("semanticType"),
             description=Translation.from_dict(data["description"])
             if "description" in data
@@ -452,6 +485,40 @@ class Attribute:
             items=items,
         )
 
+    def as_arrow_field(self):
+        """Convert to Apache Arrow field. Requires pyarrow.
+
+        The item type of arrays is taken from the items definition. Categorical string
+        attributes are dictionary encoded. Dates are only mapped to an Arrow date if
+        their valueFormat is a full date, dates in the YYYY format are mapped to a
+        16-bit integer and other formats to a string. The field is nullable unless
+        the attribute is not nullable, and the Dutch and English descriptions are
+        stored in the field metadata as 'description:nl' and 'description:en'.
+        """
+        import pyarrow as pa
+
+        if self.items is not None:
+            data_type = pa.list_(self.items.type.as_arrow())
+        elif self.values is not None and self.type.base_type == BaseType.STRING:
+            data_type = pa.dictionary(pa.int32(), pa.string())
+        elif self.type.base_type == BaseType.DATE and self.value_format not in (
+            None,
+            "YYYY-MM-DD",
+        ):
+            data_type = pa.int16() if self.value_format == "YYYY" else pa.string()
+        else:
+            data_type = self.type.as_arrow()
+        metadata = {
+            f"description:{lang}": self.description.get_translation(lang)
+            for lang in DocumentationLanguage
+        }
+        return pa.field(
+            self.name,
+            data_type,
+            nullable=self.nullable is not False,
+            metadata=metadata,
+        )
+
 
 def load_attributes_from_json(json_path: Path) -> Dict[str, Attribute]:
     """
@@ -0,0 +1,384 @@
+"""
+The fetch module implements a pipeline that fetches 3DBAG tiles listed in a tile index
+and validates their attributes against the attribute specifications.
+
+Downloads run concurrently on a bounded pool of connections and are retried on
+transient errors. Each finished download is handed to a process pool for validation.
+The number of downloaded tiles that wait for validation is bounded, so that the
+downloads are throttled when the validation cannot keep up.
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bag3d.specs.core import Attribute, load_attributes_spec
+from bag3d.specs.validation import validate_file
+
+_RETRY_HTTP_CODES = (408, 429, 500, 502, 503, 504)
+
+
+@dataclass
+class Tile:
+    """A tile in the tile index.
+
+    Attributes:
+        tile_id: str
+        source: str. URL or local path of the tile file.
+    """
+
+    tile_id: str
+    source: str
+
+
+@dataclass
+class TileResult:
+    """The outcome of fetching and validating a tile.
+
+    Attributes:
+        tile: Tile
+        errors: List[str]. The validation errors, at most max_errors of them.
+        n_errors: int. The total number of validation errors.
+        failure: Optional[str]. The reason why the tile could not be fetched or read.
+    """
+
+    tile: Tile
+    errors: List[str] = field(default_factory=list)
+    n_errors: int = 0
+    failure: Optional[str] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.failure is None and self.n_errors == 0
+
+
+@dataclass
+class PipelineReport:
+    """Summary of a pipeline run.
+
+    Attributes:
+        n_valid: int
+        n_invalid: int. The number of tiles with validation errors.
+        n_failed: int. The number of tiles that could not be fetched or read.
+        elapsed: float. Wall-clock time of the run in seconds.
+        results: List[TileResult]. The results of the tiles, only kept if they are
+            not passed to an on_result callback.
+    """
+
+    n_valid: int = 0
+    n_invalid: int = 0
+    n_failed: int = 0
+    elapsed: float = 0.0
+    results: List[TileResult] = field(default_factory=list)
+
+    @property
+    def n_tiles(self) -> int:
+        return self.n_valid + self.n_invalid + self.n_failed
+
+    @property
+    def tiles_per_second(self) -> float:
+        """End-to-end throughput, from the start of the first download until the
+        last validation finished."""
+        return self.n_tiles / self.elapsed if self.elapsed > 0 else 0.0
+
+    def add(self, result: TileResult, keep: bool) -> None:
+        """Count the result of a tile, and keep it in results if keep is True."""
+        if result.failure is not None:
+            self.n_failed += 1
+        elif result.n_errors:
+            self.n_invalid += 1
+        else:
+            self.n_valid += 1
+        if keep:
+            self.results.append(result)
+
+
+def _resolve_source(reference: str, base: Optional[str]) -> str:
+    """Resolve a tile reference from the index against the base URL or directory."""
+    if urllib.parse.urlparse(reference).scheme in ("http", "https", "file"):
+        return reference
+    if base is None:
+        return reference
+    if urllib.parse.urlparse(base).scheme in ("http", "https", "file"):
+        return urllib.parse.urljoin(base.rstrip("/") + "/", reference.lstrip("/"))
+    return str(Path(base) / reference)
+
+
+def read_tile_index(
+    path: Path, column: str = "cj_download", base: Optional[str] = None
+) -> Iterator[Tile]:
+    """Read the tiles from a tile index.
+
+    The tile index is either a CSV file or a GeoPackage with a 'tile_id' column and
+    a column with the URL or path of the tile file.
+
+    Args:
+        path: Path to the tile index.
+        column: The column that contains the URL or path of the tile file.
+        base: Base URL or directory that relative references are resolved against.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".gpkg":
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            table = connection.execute(
+                "SELECT table_name FROM gpkg_contents WHERE data_type = 'features'"
+            ).fetchone()
+            if table is None:
+                raise ValueError(f"The tile index {path} does not contain a layer")
+            query = f'SELECT tile_id, "{column}" FROM "{table[0]}" ORDER BY tile_id'
+            for tile_id, reference in connection.execute(query):
+                yield Tile(str(tile_id), _resolve_source(reference, base))
+        finally:
+            connection.close()
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield Tile(row["tile_id"], _resolve_source(row[column], base))
+
+
+def _local_path(source: str) -> Optional[Path]:
+    """Return the local path of the source, or None if it needs to be downloaded."""
+    parsed = urllib.parse.urlparse(source)
+    if parsed.scheme == "file":
+        return Path(urllib.request.url2pathname(parsed.path))
+    if parsed.scheme in ("http", "https"):
+        return None
+    return Path(source)
+
+
+def _download(url: str, destination: Path, timeout: float) -> None:
+    """Download the url to the destination, without holding the file in memory."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        with open(destination, "wb") as f:
+            shutil.copyfileobj(response, f)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Is it worth retrying the download after this error?"""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in _RETRY_HTTP_CODES
+    return isinstance(error, (urllib.error.URLError, OSError, TimeoutError))
+
+
+_attributes: Optional[Dict[str, Attribute]] = None
+
+
+def _init_worker() -> None:
+    """Load the attribute specifications once per worker process."""
+    global _attributes
+    _attributes = load_attributes_spec()
+
+
+def _validate_tile(path: str, max_errors: int) -> Tuple[List[str], int]:
+    """Validate a tile file in a worker process. Returns the first max_errors
+    errors and the total number of errors."""
+    errors = validate_file(Path(path), _attributes)
+    return errors[:max_errors], len(errors)
+
+
+async def fetch_and_validate(
+    tiles: Iterable[Tile],
+    scratch_dir: Path,
+    max_connections: int = 8,
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 60.0,
+    max_errors: int = 100,
+    on_result: Optional[Callable[[TileResult], None]] = None,
+) -> PipelineReport:
+    """Fetch the tiles concurrently and validate each one as soon as it is fetched.
+
+    Tiles with a local path (or file:// URL) are validated in place, other tiles are
+    downloaded to the scratch directory and removed once they are validated.
+
+    Args:
+        tiles: The tiles to fetch, for example from read_tile_index.
+        scratch_dir: Directory for the downloaded tiles.
+        max_connections: The maximum number of concurrent downloads.
+        max_workers: The number of validation processes. Defaults to the CPU count.
+        max_pending: The maximum number of fetched tiles that wait for validation.
+            Defaults to twice the number of validation processes.
+        retries: The number of retries of a download after a transient error.
+        backoff: The delay before the first retry in seconds, doubled on each retry.
+        timeout: The timeout of a download request in seconds.
+        max_errors: The maximum number of validation errors that are kept per tile.
+        on_result: Called with each TileResult as soon as the tile is finished. If
+            provided, the results are not kept in the report, only counted, so that
+            the memory use does not grow with the number of tiles.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    scratch_dir = Path(scratch_dir)
+    scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    tiles_iter = iter(tiles)
+    fetched = asyncio.Queue(maxsize=max_pending)
+    validating = asyncio.Semaphore(max_workers)
+    report = PipelineReport()
+
+    def finish(result: TileResult) -> None:
+        report.add(result, keep=on_result is None)
+        if on_result is not None:
+            on_result(result)
+
+    async def fetch(tile: Tile, pool: ThreadPoolExecutor) -> Path:
+        filename = Path(urllib.parse.urlparse(tile.source).path).name
+        destination = scratch_dir / f"{tile.tile_id.replace('/', '-')}-{filename}"
+        for attempt in range(retries + 1):
+            try:
+                await loop.run_in_executor(
+                    pool, _download, tile.source, destination, timeout
+                )
+                return destination
+            except Exception as e:
+                if attempt == retries or not _is_transient(e):
+                    destination.unlink(missing_ok=True)
+                    raise
+                await asyncio.sleep(backoff * 2**attempt)
+
+    async def fetcher(pool: ThreadPoolExecutor) -> None:
+        for tile in tiles_iter:
+            local = _local_path(tile.source)
+            if local is not None:
+                await fetched.put((tile, local, False))
+                continue
+            try:
+                path = await fetch(tile, pool)
+            except Exception as e:
+                finish(TileResult(tile, failure=f"fetch failed: {e}"))
+                continue
+            await fetched.put((tile, path, True))
+
+    async def validate(
+        tile: Tile, path: Path, is_download: bool, pool: ProcessPoolExecutor
+    ) -> None:
+        try:
+            errors, n_errors = await loop.run_in_executor(
+                pool, _validate_tile, str(path), max_errors
+            )
+            finish(TileResult(tile, errors=errors, n_errors=n_errors))
+        except Exception as e:
+            finish(TileResult(tile, failure=f"validation failed: {e}"))
+        finally:
+            validating.release()
+            if is_download:
+                path.unlink(missing_ok=True)
+
+    async def dispatcher(pool: ProcessPoolExecutor) -> None:
+        pending = set()
+        while (item := await fetched.get()) is not None:
+            await validating.acquire()
+            task = asyncio.create_task(validate(*item, pool))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    start = time.perf_counter()
+    with (
+        ThreadPoolExecutor(max_workers=max_connections) as fetch_pool,
+        ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker
+        ) as validate_pool,
+    ):
+        dispatch = asyncio.create_task(dispatcher(validate_pool))
+        await asyncio.gather(*(fetcher(fetch_pool) for _ in range(max_connections)))
+        await fetched.put(None)
+        await dispatch
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch the tiles in a tile index and validate their attributes"
+    )
+    parser.add_argument(
+        "--index", "-i", required=True, help="Path to the tile index (.csv or .gpkg)"
+    )
+    parser.add_argument(
+        "--base",
+        "-b",
+        help="Base URL or directory that relative tile references are resolved against",
+    )
+    parser.add_argument(
+        "--column",
+        default="cj_download",
+        help="Column of the tile index with the tile URL or path",
+    )
+    parser.add_argument("--scratch", help="Directory for the downloaded tiles")
+    parser.add_argument(
+        "--connections", type=int, default=8, help="Number of concurrent downloads"
+    )
+    parser.add_argument("--workers", type=int, help="Number of validation processes")
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="Maximum number of downloaded tiles that wait for validation",
+    )
+    parser.add_argument("--retries", type=int, default=3, help="Download retries")
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="Download timeout in seconds"
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=100,
+        help="Maximum number of validation errors that are reported per tile",
+    )
+
+    args = parser.parse_args()
+
+    def print_result(result: TileResult) -> None:
+        if result.failure is not None:
+            print(f"❌ {result.tile.tile_id}: {result.failure}")
+        elif result.n_errors:
+            print(f"❌ {result.tile.tile_id}: {result.n_errors} validation errors")
+            for error in result.errors:
+                print(f"   {error}")
+            if result.n_errors > len(result.errors):
+                print(f"   ... and {result.n_errors - len(result.errors)} more")
+
+    with tempfile.TemporaryDirectory(dir=args.scratch) as scratch_dir:
+        report = asyncio.run(
+            fetch_and_validate(
+                read_tile_index(args.index, column=args.column, base=args.base),
+                Path(scratch_dir),
+                max_connections=args.connections,
+                max_workers=args.workers,
+                max_pending=args.max_pending,
+                retries=args.retries,
+                timeout=args.timeout,
+                max_errors=args.max_errors,
+                on_result=print_result,
+            )
+        )
+
+    print(
+        f"{report.n_tiles} tiles in {report.elapsed:.1f}s "
+        f"({report.tiles_per_second:.2f} tiles/s): {report.n_valid} valid, "
+        f"{report.n_invalid} invalid, {report.n_failed} failed"
+    )
+    if report.n_valid != report.n_tiles:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+The readers module streams the attributes of 3DBAG objects from the distributed
+formats. Each object is yielded as a Record, which carries the location of the object
+(see CityJSONLocation, GpkgLocation, Cesium3dTilesLocation) and its BAG
+identificatie, so that the records of the different formats can be related to each
+other and to the attribute specifications.
+"""
+
+import gzip
+import json
+import sqlite3
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from bag3d.specs.core import (
+    Attribute,
+    Cesium3dTilesLocation,
+    CityJSONLocation,
+    GpkgLocation,
+)
+from bag3d.specs.values import coerce_value
+
+Location = Union[CityJSONLocation, GpkgLocation, Cesium3dTilesLocation]
+
+# The lod*_3d GeoPackage layers are left out, because they have a record per building
+# part, keyed by b3_pand_deel_id, and the lod*_2d layers have a record per surface.
+BUILDING_LOCATIONS: tuple[Location, ...] = (
+    CityJSONLocation.Building,
+    GpkgLocation.pand,
+    *Cesium3dTilesLocation,
+)
+"""The locations that have exactly one record per building, so that their records
+can be related on the identificatie."""
+
+
+def partition_of(identificatie: str, n_partitions: int) -> int:
+    """Return the hash partition of an identificatie. Unlike hash(), crc32 is stable
+    across processes."""
+    return zlib.crc32(identificatie.encode("utf-8")) % n_partitions
+
+
+@dataclass
+class Record:
+    """The attributes of a single object in one of the distributed formats.
+
+    Attributes:
+        location: Location
+        identificatie: Optional[str]
+        attributes: Dict[str, Any]
+    """
+
+    location: Location
+    identificatie: Optional[str]
+    attributes: Dict[str, Any]
+
+
+def _open_text(path: Path):
+    """Open a (possibly gzipped) text file for reading."""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_cityjson_records(cityjson: dict) -> Iterator[Record]:
+    """Yield the records of the CityObjects and semantic surfaces in a CityJSON
+    object or CityJSONFeature.
+
+    Building parts and semantic surfaces do not have an identificatie attribute, they
+    inherit the identificatie of their parent Building. CityObjects and surfaces of a
+    type that is not a CityJSONLocation are skipped.
+    """
+    city_objects = cityjson.get("CityObjects", {})
+    for co in city_objects.values():
+        try:
+            location = CityJSONLocation.from_string(co.get("type"))
+        except ValueError:
+            continue
+        attributes = co.get("attributes") or {}
+        identificatie = attributes.get("identificatie")
+        if identificatie is None:
+            for parent_id in co.get("parents", []):
+                parent = city_objects.get(parent_id, {})
+                identificatie = (parent.get("attributes") or {}).get("identificatie")
+                if identificatie is not None:
+                    break
+        yield Record(location, identificatie, attributes)
+
+        for geometry in co.get("geometry", []):
+            semantics = geometry.get("semantics") or {}
+            for surface in semantics.get("surfaces", []):
+                try:
+                    surface_location = CityJSONLocation.from_string(surface.get("type"))
+                except ValueError:
+                    continue
+                surface_attributes = {
+                    key: value
+                    for key, value in surface.items()
+                    if key not in ("type", "parent", "children")
+                }
+                yield Record(surface_location, identificatie, surface_attributes)
+
+
+def read_cityjson(path: Path) -> Iterator[Record]:
+    """Read the records from a CityJSON file (.city.json, optionally gzipped)."""
+    with _open_text(path) as f:
+        cityjson = json.load(f)
+    yield from iter_cityjson_records(cityjson)
+
+
+def read_cityjsonseq(path: Path) -> Iterator[Record]:
+    """Stream the records from a CityJSONSeq file (.city.jsonl, optionally gzipped),
+    one CityJSONFeature at a time."""
+    with _open_text(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            feature = json.loads(line)
+            if feature.get("type") != "CityJSONFeature":
+                continue
+            yield from iter_cityjson_records(feature)
+
+
+def read_gpkg(
+    path: Path,
+    attributes: Optional[Dict[str, Attribute]] = None,
+    layers: Optional[Iterable[GpkgLocation]] = None,
+) -> Iterator[Record]:
+    """Stream the records from the layers of a 3DBAG GeoPackage.
+
+    Args:
+        path: Path to the GeoPackage.
+        attributes: If provided, the values of the specified attributes are converted
+            from their storage type with coerce_value.
+        layers: The layers to read. By default, all the GpkgLocation layers that are
+            present in the GeoPackage are read.
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        present = {
+            row["table_name"]
+            for row in connection.execute(
+                "SELECT table_name FROM gpkg_contents WHERE data_type = 'features'"
+            )
+        }
+        geometry_columns = {
+            row["table_name"]: row["column_name"]
+            for row in connection.execute(
+                "SELECT table_name, column_name FROM gpkg_geometry_columns"
+            )
+        }
+        for layer in layers if layers is not None else GpkgLocation:
+            if layer.value not in present:
+                continue
+            skip = {"fid", geometry_columns.get(layer.value)}
+            for row in connection.execute(f'SELECT * FROM "{layer.value}"'):
+                values = {}
+                for key in row.keys():
+                    if key in skip:
+                        continue
+                    value = row[key]
+                    if attributes is not None and key in attributes:
+                        value = coerce_value(attributes[key], value)
+                    values[key] = value
+                yield Record(layer, values.get("identificatie"), values)
+    finally:
+        connection.close()
+
+
+_COMPONENT_TYPES = {
+    "INT8": "b",
+    "UINT8": "B",
+    "INT16": "h",
+    "UINT16": "H",
+    "INT32": "i",
+    "UINT32": "I",
+    "INT64": "q",
+    "UINT64": "Q",
+    "FLOAT32": "f",
+    "FLOAT64": "d",
+}
+
+# The largest value of the integer component types, that maps to 1.0 if normalized
+_NORMALIZED_MAX = {
+    "INT8": 2**7 - 1,
+    "UINT8": 2**8 - 1,
+    "INT16": 2**15 - 1,
+    "UINT16": 2**16 - 1,
+    "INT32": 2**31 - 1,
+    "UINT32": 2**32 - 1,
+    "INT64": 2**63 - 1,
+    "UINT64": 2**64 - 1,
+}
+
+
+def _read_glb(path: Path) -> tuple[dict, bytes]:
+    """Read the JSON and the binary chunk of a binary glTF file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _, _ = struct.unpack_from("<4sII", data, 0)
+    if magic != b"glTF":
+        raise ValueError(f"Not a binary glTF file: {path}")
+    offset = 12
+    gltf, binary = None, b""
+    while offset < len(data):
+        chunk_length, chunk_type = struct.unpack_from("<I4s", data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == b"JSON":
+            gltf = json.loads(chunk)
+        elif chunk_type == b"BIN\x00":
+            binary = chunk
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise ValueError(f"The glTF file does not contain a JSON chunk: {path}")
+    return gltf, binary
+
+
+def _decode_property(
+    definition: dict, prop: dict, count: int, views: list, enums: dict
+) -> list:
+    """Decode the values of a property in an EXT_structural_metadata property table.
+
+    Supports SCALAR, BOOLEAN, STRING and ENUM properties, as single values and as
+    fixed- or variable-length arrays. The normalized, scale and offset properties of
+    SCALAR properties are applied in that order, with the scale and offset of the
+    property table overriding the ones of the class. The noData value is compared to
+    the stored values, before they are transformed.
+
+    References:
+        - 3D Metadata specification:
+          https://github.com/CesiumGS/3d-tiles/tree/main/specification/Metadata
+    """
+    prop_type = definition["type"]
+    if prop_type == "ENUM":
+        enum = enums[definition["enumType"]]
+        component_type = enum.get("valueType", "UINT16")
+        names = {v["value"]: v["name"] for v in enum["values"]}
+    else:
+        component_type = definition.get("componentType")
+
+    def offsets(view_index: int, offset_type: str, n: int) -> tuple:
+        return struct.unpack_from(
+            f"<{n}{_COMPONENT_TYPES[offset_type]}", views[view_index]
+        )
+
+    values_view = views[prop["values"]]
+    if definition.get("array") and "count" not in definition:
+        array_offsets = offsets(
+            prop["arrayOffsets"], prop.get("arrayOffsetType", "UINT32"), count + 1
+        )
+        spans = [(array_offsets[i], array_offsets[i + 1]) for i in range(count)]
+        n_elements = array_offsets[-1]
+    elif definition.get("array"):
+        size = definition["count"]
+        spans = [(i * size, (i + 1) * size) for i in range(count)]
+        n_elements = count * size
+    else:
+        spans = None
+        n_elements = count
+
+    if prop_type == "BOOLEAN":
+        elements = [bool(values_view[i // 8] >> (i % 8) & 1) for i in range(n_elements)]
+    elif prop_type == "STRING":
+        string_offsets = offsets(
+            prop["stringOffsets"],
+            prop.get("stringOffsetType", "UINT32"),
+            n_elements + 1,
+        )
+        elements = [
+            values_view[string_offsets[i] : string_offsets[i + 1]].decode("utf-8")
+            for i in range(n_elements)
+        ]
+    else:
+        elements = list(
+            struct.unpack_from(
+                f"<{n_elements}{_COMPONENT_TYPES[component_type]}", values_view
+            )
+        )
+        if prop_type == "ENUM":
+            elements = [names.get(e) for e in elements]
+
+    normalized = definition.get("normalized", False)
+    scale = prop.get("scale", definition.get("scale"))
+    offset = prop.get("offset", definition.get("offset"))
+    if (normalized or scale is not None or offset is not None) and (
+        prop_type != "SCALAR"
+    ):
+        raise ValueError(
+            "normalized, scale and offset are only supported for SCALAR "
+            f"properties, not {prop_type}"
+        )
+
+    def transform(e, i: int):
+        if normalized:
+            e = max(e / _NORMALIZED_MAX[component_type], -1.0)
+        # Fixed-length arrays have a scale and offset per element
+        if scale is not None:
+            e *= scale[i] if isinstance(scale, list) else scale
+        if offset is not None:
+            e += offset[i] if isinstance(offset, list) else offset
+        return e
+
+    no_data = definition.get("noData")
+    if spans is None:
+        return [None if e == no_data else transform(e, 0) for e in elements]
+    return [
+        None
+        if elements[start:end] == no_data
+        else [transform(e, i) for i, e in enumerate(elements[start:end])]
+        for start, end in spans
+    ]
+
+
+def read_glb(path: Path, location: Cesium3dTilesLocation) -> Iterator[Record]:
+    """Read the records from the EXT_structural_metadata property tables of a binary
+    glTF (.glb) tile content of a 3D Tiles tileset.
+
+    The glTF files do not record which tileset they belong to, therefore the
+    location must be provided.
+    """
+    gltf, binary = _read_glb(path)
+    metadata = gltf.get("extensions", {}).get("EXT_structural_metadata")
+    if metadata is None:
+        return
+    schema = metadata.get("schema", {})
+    classes = schema.get("classes", {})
+    enums = schema.get("enums", {})
+    views = []
+    for view in gltf.get("bufferViews", []):
+        start = view.get("byteOffset", 0)
+        views.append(binary[start : start + view["byteLength"]])
+
+    for table in metadata.get("propertyTables", []):
+        definitions = classes[table["class"]].get("properties", {})
+        count = table["count"]
+        columns = {
+            name: _decode_property(definitions[name], prop, count, views, enums)
+            for name, prop in table.get("properties", {}).items()
+        }
+        for i in range(count):
+            values = {name: column[i] for name, column in columns.items()}
+            yield Record(location, values.get("identificatie"), values)
+
+
+_SUFFIXES = (".json", ".jsonl", ".gpkg", ".glb")
+
+
+def _format_suffix(path: Path) -> str:
+    """Return the extension that identifies the format, ignoring a .gz extension."""
+    suffixes = [s.lower() for s in path.suffixes]
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes = suffixes[:-1]
+    return suffixes[-1] if suffixes else ""
+
+
+def iter_files(path: Path) -> Iterator[Path]:
+    """Yield the path if it is a file, or the supported files in the directory tree
+    in sorted order."""
+    path = Path(path)
+    if path.is_file():
+        yield path
+        return
+    for p in sorted(path.rglob("*")):
+        if p.is_file() and _format_suffix(p) in _SUFFIXES:
+            yield p
+
+
+def read_records(
+    path: Path,
+    attributes: Optional[Dict[str, Attribute]] = None,
+    location: Optional[Cesium3dTilesLocation] = None,
+) -> Iterator[Record]:
+    """Read the records from a file, choosing the reader from the file extension.
+
+    Supported are CityJSON (.json), CityJSONSeq (.jsonl), both optionally gzipped,
+    GeoPackage (.gpkg) and 3D Tiles glTF content (.glb). The location is required
+    for glTF content, see read_glb.
+    """
+    path = Path(path)
+    suffix = _format_suffix(path)
+    if suffix == ".gpkg":
+        return read_gpkg(path, attributes)
+    if suffix == ".jsonl":
+        return read_cityjsonseq(path)
+    if suffix == ".json":
+        return read_cityjson(path)
+    if suffix == ".glb":
+        if location is None:
+            raise ValueError(f"The 3D Tiles location is required to read {path}")
+        return read_glb(path, location)
+    raise ValueError(f"Unsupported file format: {path}")
@@ -0,0 +1,163 @@
+"""
+The validation module checks the attributes of 3DBAG objects against the attribute
+specifications: whether the attribute is specified for the location of the object,
+and whether the value matches the type, nullability, the categorical values and the
+value format of dates.
+"""
+
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bag3d.specs.core import (
+    Attribute,
+    BaseType,
+    Cesium3dTilesLocation,
+    CityJSONLocation,
+    GpkgLocation,
+    load_attributes_spec,
+)
+from bag3d.specs.readers import Record, read_records
+
+_PYTHON_TYPES = {
+    BaseType.INT: (int,),
+    BaseType.FLOAT: (int, float),
+    BaseType.BOOL: (bool,),
+    BaseType.STRING: (str,),
+    BaseType.DATE: (str,),
+    BaseType.DATETIME: (str,),
+    BaseType.ARRAY: (list,),
+    BaseType.NULL: (type(None),),
+}
+
+# The regular expression and the strptime format per valueFormat of the DATE and
+# DATETIME attributes. The regular expression fixes the number of digits, strptime
+# checks that the date exists. GeoPackage stores datetimes with a 'Z' suffix.
+_DATE_FORMATS = {
+    "YYYY": (re.compile(r"\d{4}"), "%Y"),
+    "YYYY-MM-DD": (re.compile(r"\d{4}-\d{2}-\d{2}"), "%Y-%m-%d"),
+    "YYYY-MM-DDThh:mm:ss.sss": (
+        re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z?"),
+        "%Y-%m-%dT%H:%M:%S.%f",
+    ),
+}
+
+
+def _is_type(base_type: BaseType, value: Any) -> bool:
+    """Is the value an instance of the Python type of the base type?"""
+    if isinstance(value, bool) and base_type != BaseType.BOOL:
+        return False
+    return isinstance(value, _PYTHON_TYPES[base_type])
+
+
+def check_value(attribute: Attribute, value: Any) -> List[str]:
+    """Check a single attribute value against its specification.
+
+    Returns:
+        A list of error messages, empty if the value is valid.
+
+    >>> from bag3d.specs.core import load_attributes_spec
+    >>> spec = load_attributes_spec()
+    >>> check_value(spec["b3_dak_type"], "slanted")
+    []
+    >>> check_value(spec["b3_dak_type"], "flat")
+    ["value 'flat' is not one of the allowed values"]
+    >>> check_value(spec["b3_pw_datum"], "2022-05")
+    ["value '2022-05' does not match the format YYYY"]
+    """
+    if value is None:
+        if attribute.nullable is False:
+            return ["value is null, but the attribute is not nullable"]
+        return []
+
+    base_type = attribute.type.base_type
+    if not _is_type(base_type, value):
+        return [
+            f"value {value!r} is not of type {attribute.type} "
+            f"({attribute.type.as_python()})"
+        ]
+
+    if base_type == BaseType.ARRAY and attribute.type.sub_type is not None:
+        for item in value:
+            if item is not None and not _is_type(attribute.type.sub_type, item):
+                return [
+                    f"array item {item!r} is not of type {attribute.type.sub_type.name}"
+                ]
+
+    if attribute.values is not None:
+        key = str(value).lower() if isinstance(value, bool) else value
+        if key not in attribute.values:
+            return [f"value {value!r} is not one of the allowed values"]
+
+    if base_type in (BaseType.DATE, BaseType.DATETIME):
+        date_format = _DATE_FORMATS.get(attribute.value_format)
+        if date_format is not None:
+            pattern, strptime_format = date_format
+            try:
+                if pattern.fullmatch(value) is None:
+                    raise ValueError
+                datetime.strptime(value.removesuffix("Z"), strptime_format)
+            except ValueError:
+                return [
+                    f"value {value!r} does not match the format "
+                    f"{attribute.value_format}"
+                ]
+
+    return []
+
+
+def _applies_to(attribute: Attribute, record: Record) -> bool:
+    """Is the attribute specified for the location of the record?"""
+    if isinstance(record.location, CityJSONLocation):
+        applies_to = attribute.applies_to.cityjson
+    elif isinstance(record.location, GpkgLocation):
+        applies_to = attribute.applies_to.gpkg
+    elif isinstance(record.location, Cesium3dTilesLocation):
+        applies_to = attribute.applies_to.cesium3dtiles
+    else:
+        return False
+    return applies_to is not None and record.location in applies_to["locations"]
+
+
+def validate_record(record: Record, attributes: Dict[str, Attribute]) -> List[str]:
+    """Validate all the attributes of a record against the attribute specifications.
+
+    Returns:
+        A list of error messages, empty if the record is valid.
+    """
+    errors = []
+    prefix = f"{record.identificatie} ({record.location.value})"
+    for name, value in record.attributes.items():
+        attribute = attributes.get(name)
+        if attribute is None:
+            errors.append(f"{prefix}: {name}: attribute is not specified")
+            continue
+        if not _applies_to(attribute, record):
+            errors.append(
+                f"{prefix}: {name}: attribute is not specified for this location"
+            )
+            continue
+        errors.extend(f"{prefix}: {name}: {e}" for e in check_value(attribute, value))
+    return errors
+
+
+def validate_file(
+    path: Path, attributes: Optional[Dict[str, Attribute]] = None
+) -> List[str]:
+    """Validate the attributes of all objects in a CityJSON, CityJSONSeq or
+    GeoPackage file.
+
+    Args:
+        path: Path to the file.
+        attributes: The attribute specifications. Defaults to the packaged specs.
+
+    Returns:
+        A list of error messages, empty if the file is valid.
+    """
+    if attributes is None:
+        attributes = load_attributes_spec()
+    errors = []
+    for record in read_records(path, attributes):
+        errors.extend(validate_record(record, attributes))
+    return errors
@@ -0,0 +1,143 @@
+"""
+The values module converts attribute values between their storage representation in
+the distributed formats and their Python representation, as defined by the attribute
+specifications, and compares values across formats.
+"""
+
+import json
+import math
+from typing import Any, Optional
+
+from bag3d.specs.core import Attribute, BaseType
+
+# The relative rounding error of a single-precision float
+_FLOAT32_EPSILON = 2**-24
+
+
+def coerce_value(attribute: Attribute, value: Any) -> Any:
+    """Convert a value as it is stored in a GeoPackage to its Python type.
+
+    GeoPackage does not have a native boolean or list type, so booleans are stored as
+    0/1 integers and arrays as JSON text. Other values are returned unchanged.
+
+    >>> from bag3d.specs.core import load_attributes_spec
+    >>> spec = load_attributes_spec()
+    >>> coerce_value(spec["b3_is_glas_dak"], 0)
+    False
+    >>> coerce_value(spec["b3_val3dity_lod22"], "[102, 203]")
+    [102, 203]
+    """
+    if value is None:
+        return None
+    if attribute.type.base_type == BaseType.BOOL and isinstance(value, int):
+        return bool(value)
+    if attribute.type.base_type == BaseType.ARRAY and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def _normalize_scalar(
+    base_type: Optional[BaseType], precision: Optional[int], value: Any
+) -> Any:
+    """Normalize a single (non-array) value, see normalize_value."""
+    if value is None:
+        return None
+    if base_type == BaseType.FLOAT and isinstance(value, (int, float)):
+        value = float(value)
+        if precision is not None:
+            value = round(value, precision)
+        else:
+            # Six significant digits, the relative tolerance of values_equal
+            value = float(f"{value:.6g}")
+        # Adding zero turns -0.0 into 0.0, which json.dumps writes differently
+        return value + 0.0
+    if base_type == BaseType.INT and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if base_type == BaseType.BOOL:
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if isinstance(value, int):
+            return bool(value)
+    return value
+
+
+def normalize_value(attribute: Attribute, value: Any) -> Any:
+    """Normalize a value to a canonical representation of its specified type.
+
+    Booleans and arrays are coerced from their storage type, integral floats become
+    integers, and floats are rounded to the precision of the attribute, or to six
+    significant digits if the attribute has no precision, so that the representation
+    of a value does not depend on the format it was read from.
+
+    >>> from bag3d.specs.core import load_attributes_spec
+    >>> spec = load_attributes_spec()
+    >>> normalize_value(spec["b3_h_nok"], 12.3456)
+    12.35
+    >>> normalize_value(spec["b3_h_min"], -0.004)
+    0.0
+    >>> normalize_value(spec["b3_h_maaiveld"], 1.2300000001)
+    1.23
+    >>> normalize_value(spec["b3_kas_warenhuis"], "true")
+    True
+    """
+    value = coerce_value(attribute, value)
+    if attribute.type.base_type == BaseType.ARRAY and isinstance(value, list):
+        return [
+            _normalize_scalar(attribute.type.sub_type, attribute.precision, item)
+            for item in value
+        ]
+    return _normalize_scalar(attribute.type.base_type, attribute.precision, value)
+
+
+def _scalars_equal(
+    base_type: Optional[BaseType], precision: Optional[int], a: Any, b: Any
+) -> bool:
+    """Compare two coerced, not yet rounded, scalar values, see values_equal."""
+    if (
+        base_type == BaseType.FLOAT
+        and isinstance(a, (int, float))
+        and isinstance(b, (int, float))
+    ):
+        if precision is not None:
+            if round(a, precision) == round(b, precision):
+                return True
+            # Values on either side of a rounding boundary, eg. 10.2549 and 10.2551,
+            # plus the rounding error of single-precision storage, which exceeds the
+            # precision for large values, eg. 1234567.89 is stored as 1234567.875
+            tolerance = 0.5 * 10**-precision + _FLOAT32_EPSILON * max(abs(a), abs(b))
+            return abs(a - b) <= tolerance + 1e-9
+        return math.isclose(a, b, rel_tol=1e-6)
+    a = _normalize_scalar(base_type, precision, a)
+    b = _normalize_scalar(base_type, precision, b)
+    return a == b
+
+
+def values_equal(attribute: Attribute, a: Any, b: Any) -> bool:
+    """Compare two values of an attribute, tolerating differences in representation.
+
+    Floats with a precision are equal if they round to the same value at that
+    precision, or if they differ by at most half a unit of the precision, which
+    absorbs values that are rounded in one format and not in the other, plus the
+    rounding error of single-precision storage. Floats without a precision are
+    compared with a relative tolerance of 1e-6.
+
+    >>> from bag3d.specs.core import load_attributes_spec
+    >>> spec = load_attributes_spec()
+    >>> values_equal(spec["b3_h_nok"], 12.345678, 12.35)
+    True
+    >>> values_equal(spec["b3_h_nok"], 12.35, 12.36)
+    False
+    """
+    a = coerce_value(attribute, a)
+    b = coerce_value(attribute, b)
+    if attribute.type.base_type == BaseType.ARRAY:
+        if isinstance(a, list) and isinstance(b, list):
+            return len(a) == len(b) and all(
+                _scalars_equal(attribute.type.sub_type, attribute.precision, x, y)
+                for x, y in zip(a, b)
+            )
+        return a == b
+    return _scalars_equal(attribute.type.base_type, attribute.precision, a, b)
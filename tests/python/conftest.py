@@ -0,0 +1,64 @@
+import json
+import sqlite3
+
+import pytest
+
+
+def _write_cityjsonseq(path, buildings):
+    """Write a CityJSONSeq file with a Building per identificatie."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [{"type": "CityJSON", "version": "2.0", "vertices": []}]
+    for identificatie, attributes in buildings.items():
+        lines.append(
+            {
+                "type": "CityJSONFeature",
+                "id": identificatie,
+                "CityObjects": {
+                    identificatie: {
+                        "type": "Building",
+                        "attributes": {"identificatie": identificatie, **attributes},
+                    }
+                },
+                "vertices": [],
+            }
+        )
+    path.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+
+
+def _write_gpkg(path, buildings):
+    """Write a GeoPackage with a pand layer with a row per identificatie."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = sorted({name for attributes in buildings.values() for name in attributes})
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        f"""
+        CREATE TABLE gpkg_contents (table_name TEXT, data_type TEXT);
+        CREATE TABLE gpkg_geometry_columns (table_name TEXT, column_name TEXT);
+        INSERT INTO gpkg_contents VALUES ('pand', 'features');
+        INSERT INTO gpkg_geometry_columns VALUES ('pand', 'geom');
+        CREATE TABLE pand (
+            fid INTEGER PRIMARY KEY, geom BLOB, identificatie TEXT
+            {"".join(f", {name}" for name in columns)}
+        );
+        """
+    )
+    connection.executemany(
+        f"INSERT INTO pand (identificatie{''.join(f', {n}' for n in columns)}) "
+        f"VALUES (?{', ?' * len(columns)})",
+        [
+            (identificatie, *(attributes.get(name) for name in columns))
+            for identificatie, attributes in buildings.items()
+        ],
+    )
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def write_cityjsonseq():
+    return _write_cityjsonseq
+
+
+@pytest.fixture
+def write_gpkg():
+    return _write_gpkg
@@ -0,0 +1,180 @@
+import json
+
+import pytest
+
+from bag3d.specs.core import (
+    AttributeType,
+    BaseType,
+    GpkgLocation,
+    load_attributes_spec,
+)
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from bag3d.specs.arrow import layer_schema, write_geoparquet  # noqa: E402
+
+
+def test_as_arrow():
+    """Can we map the attribute types to Arrow types?"""
+    assert AttributeType(BaseType.DATETIME).as_arrow() == pa.timestamp("ms")
+    assert AttributeType(BaseType.ARRAY, BaseType.INT).as_arrow() == pa.list_(
+        pa.int64()
+    )
+
+    spec = load_attributes_spec()
+    dak_type = spec["b3_dak_type"].as_arrow_field()
+    assert dak_type.type == pa.dictionary(pa.int32(), pa.string())
+    assert not dak_type.nullable
+    assert dak_type.metadata[b"description:en"] == b"Roof type of the building."
+    assert spec["b3_val3dity_lod22"].as_arrow_field().type == pa.list_(pa.int64())
+    assert spec["b3_h_nok"].as_arrow_field().nullable
+
+
+def test_layer_schema():
+    """Does the layer schema contain the attributes of the layer?"""
+    schema = layer_schema(GpkgLocation.pand)
+    assert "b3_dak_type" in schema.names
+    assert "b3_azimut" not in schema.names
+    assert schema.names[-1] == "geometry"
+
+
+def test_write_geoparquet(tmp_path):
+    """Can we write record batches to a GeoParquet file with fixed row groups?"""
+    schema = layer_schema(GpkgLocation.pand)
+    schema = pa.schema(
+        [schema.field(name) for name in ("identificatie", "b3_dak_type", "geometry")]
+    )
+    point = bytes.fromhex("0101000000000000000000f03f0000000000000040")
+    batches = [
+        pa.record_batch(
+            {
+                "identificatie": [f"NL.IMBAG.Pand.{i:016d}" for i in range(n)],
+                "b3_dak_type": ["slanted"] * n,
+                "geometry": [point] * n,
+            }
+        )
+        for n in (3, 4, 3)
+    ]
+
+    path = tmp_path / "pand.parquet"
+    assert write_geoparquet(batches, path, schema, row_group_size=4) == 10
+
+    metadata = pq.ParquetFile(path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(3)] == [4, 4, 2]
+    geo = json.loads(pq.read_schema(path).metadata[b"geo"])
+    assert geo["primary_column"] == "geometry"
+    table = pq.read_table(path)
+    assert table.schema.field("b3_dak_type").metadata[b"description:nl"]
+    assert table.column("b3_dak_type").type == pa.dictionary(pa.int32(), pa.string())
+
+
+PAND = {
+    "b3_bag_bag_overlap": 0.0,
+    "b3_bouwlagen": 2,
+    "b3_dak_type": "slanted",
+    "b3_extrusie": "standard",
+    "b3_h_maaiveld": -0.52,
+    "b3_h_nok": 8.93,
+    "b3_is_glas_dak": False,
+    "b3_kas_warenhuis": False,
+    "b3_kwaliteitsindicator": True,
+    "b3_mutatie_ahn3_ahn4": False,
+    "b3_mutatie_ahn4_ahn5": False,
+    "b3_n_nok": 1,
+    "b3_n_vlakken": 4,
+    "b3_nodata_fractie_ahn3": 0.02,
+    "b3_nodata_fractie_ahn4": 0.01,
+    "b3_nodata_fractie_ahn5": 0.0,
+    "b3_nodata_radius_ahn3": 0.84,
+    "b3_nodata_radius_ahn4": 0.51,
+    "b3_nodata_radius_ahn5": 0.33,
+    "b3_opp_buitenmuur": 120.4,
+    "b3_opp_dak_plat": 0.0,
+    "b3_opp_dak_schuin": 81.25,
+    "b3_opp_grond": 62.5,
+    "b3_opp_scheidingsmuur": 40.1,
+    "b3_puntdichtheid_ahn3": 9.4,
+    "b3_puntdichtheid_ahn4": 17.8,
+    "b3_puntdichtheid_ahn5": 24.1,
+    "b3_pw_bron": "AHN5",
+    "b3_pw_datum": "2022",
+    "b3_pw_onvoldoende": False,
+    "b3_pw_selectie_reden": "PREFERRED_AND_LATEST",
+    "b3_rmse_lod12": 0.41,
+    "b3_rmse_lod13": 0.33,
+    "b3_rmse_lod22": 0.12,
+    "b3_t_run": 431,
+    "b3_val3dity_lod12": [],
+    "b3_val3dity_lod13": [],
+    "b3_val3dity_lod22": [203],
+    "b3_volume_lod12": 402.5,
+    "b3_volume_lod13": 398.1,
+    "b3_volume_lod22": 371.9,
+    "begingeldigheid": "2010-10-21",
+    "documentdatum": "2010-10-21",
+    "documentnummer": "2010-0123",
+    "eindgeldigheid": None,
+    "eindregistratie": None,
+    "geconstateerd": False,
+    "identificatie": "NL.IMBAG.Pand.0503100000000001",
+    "oorspronkelijkbouwjaar": 1932,
+    "status": "Pand in gebruik",
+    "tijdstipeindregistratielv": None,
+    "tijdstipinactief": None,
+    "tijdstipinactieflv": None,
+    "tijdstipnietbaglv": None,
+    "tijdstipregistratie": "2010-10-21T10:19:31.000",
+    "tijdstipregistratielv": "2010-10-21T10:20:04.231",
+    "voorkomenidentificatie": 1,
+    "geometry": bytes.fromhex("0101000000000000000000f03f0000000000000040"),
+}
+
+
+def test_write_geoparquet_pand(tmp_path):
+    """Can we write all attributes of the pand layer, as they are read from a tile?"""
+    schema = layer_schema(GpkgLocation.pand)
+    assert set(schema.names) == PAND.keys()
+    batch = pa.RecordBatch.from_pylist([PAND, PAND])
+
+    path = tmp_path / "pand.parquet"
+    assert write_geoparquet([batch], path, schema) == 2
+
+    (row, _) = pq.read_table(path).to_pylist()
+    assert row["b3_pw_datum"] == 2022
+    assert row["begingeldigheid"].isoformat() == "2010-10-21"
+    assert row["tijdstipregistratielv"].microsecond == 231000
+    assert row["b3_val3dity_lod22"] == [203]
+
+
+def test_write_geoparquet_not_nullable(tmp_path):
+    """Do we report which row has a null in a column that is not nullable?"""
+    schema = layer_schema(GpkgLocation.pand)
+    rows = [PAND, {**PAND, "identificatie": "NL.IMBAG.Pand.0503100000000002"}]
+    rows[1]["b3_dak_type"] = None
+    batches = [pa.RecordBatch.from_pylist([row]) for row in rows]
+    with pytest.raises(ValueError, match=r"b3_dak_type.*row 1.*0503100000000002"):
+        write_geoparquet(batches, tmp_path / "pand.parquet", schema, row_group_size=1)
+
+
+def test_write_geoparquet_null_columns(tmp_path):
+    """Can we write batches in which a column is all null in one and not the other?"""
+    schema = layer_schema(GpkgLocation.pand)
+    ended = {
+        **PAND,
+        "eindgeldigheid": "2021-03-01",
+        "tijdstipinactief": "2021-03-01T08:00:00.000",
+    }
+    batches = [
+        pa.RecordBatch.from_pylist([PAND]),
+        pa.RecordBatch.from_pylist([ended]),
+        pa.RecordBatch.from_pylist([PAND]),
+    ]
+    assert batches[0].schema != batches[1].schema
+
+    path = tmp_path / "pand.parquet"
+    assert write_geoparquet(batches, path, schema) == 3
+
+    table = pq.read_table(path)
+    assert table.column("eindgeldigheid").null_count == 2
+    assert table.column("tijdstipinactief").type == pa.timestamp("ms")
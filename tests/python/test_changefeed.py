@@ -0,0 +1,63 @@
+import pytest
+
+from bag3d.specs.changefeed import changefeed, ChangeType
+
+IDS = [f"NL.IMBAG.Pand.050310000000000{i}" for i in range(5)]
+
+
+@pytest.mark.parametrize("suffix", [".city.jsonl", ".gpkg"])
+def test_changefeed(tmp_path, suffix, write_cityjsonseq, write_gpkg):
+    """Do we report the changed buildings and attributes, but not float noise?"""
+    write_tile = write_gpkg if suffix == ".gpkg" else write_cityjsonseq
+    old, new = tmp_path / "old", tmp_path / "new"
+    write_tile(
+        old / "9/0" / f"0{suffix}",
+        {
+            IDS[0]: {
+                "b3_h_nok": 10.251,
+                "b3_h_min": -0.004,
+                "b3_h_maaiveld": 1.23,
+                "b3_dak_type": "slanted",
+            },
+            IDS[1]: {"b3_h_nok": 11.5, "b3_h_maaiveld": 1.23, "b3_dak_type": "slanted"},
+            IDS[2]: {"b3_h_nok": 12.0, "b3_dak_type": "slanted"},
+            IDS[3]: {"b3_h_nok": 13.0, "b3_dak_type": "slanted"},
+        },
+    )
+    write_tile(
+        new / "9/0" / f"0{suffix}",
+        {
+            IDS[0]: {
+                "b3_h_nok": 10.249,
+                "b3_h_min": 0.004,
+                "b3_h_maaiveld": 1.2300000001,
+                "b3_dak_type": "slanted",
+            },
+            IDS[1]: {
+                "b3_h_nok": 11.75,
+                "b3_h_maaiveld": 1.25,
+                "b3_dak_type": "horizontal",
+            },
+            IDS[4]: {"b3_h_nok": 14.0, "b3_dak_type": "slanted"},
+        },
+    )
+    write_tile(
+        new / "9/0" / f"1{suffix}",
+        {IDS[3]: {"b3_h_nok": 13.0, "b3_dak_type": "horizontal"}},
+    )
+
+    changes = {
+        c.identificatie: c
+        for c in changefeed(
+            old, new, tmp_path / "scratch", n_partitions=4, max_workers=2
+        )
+    }
+
+    assert IDS[0] not in changes
+    assert changes[IDS[1]].change == ChangeType.modified
+    assert changes[IDS[1]].attributes == ["b3_dak_type", "b3_h_maaiveld", "b3_h_nok"]
+    assert changes[IDS[2]].change == ChangeType.removed
+    assert changes[IDS[3]].change == ChangeType.modified
+    assert changes[IDS[3]].attributes == ["b3_dak_type"]
+    assert changes[IDS[3]].tile == f"9/0/1{suffix}"
+    assert changes[IDS[4]].change == ChangeType.added
@@ -0,0 +1,188 @@
+import json
+import struct
+
+from bag3d.specs.consistency import check_consistency, Source
+from bag3d.specs.core import (
+    Cesium3dTilesLocation,
+    CityJSONLocation,
+    GpkgLocation,
+    load_attributes_spec,
+)
+from bag3d.specs.readers import read_glb, read_gpkg
+from bag3d.specs.values import values_equal
+
+IDS = ["NL.IMBAG.Pand.0503100000000001", "NL.IMBAG.Pand.0503100000000002"]
+
+
+def write_glb(path, identificaties, h_nok, definition=None, overrides=None):
+    """Write a glTF with an EXT_structural_metadata property table.
+
+    The definition and the overrides are added to the b3_h_nok property of the class
+    and of the property table, eg. to store it quantized.
+    """
+    definition = {"type": "SCALAR", "componentType": "FLOAT32", **(definition or {})}
+    code = {"FLOAT32": "f", "UINT16": "H", "INT16": "h"}[definition["componentType"]]
+    strings = "".join(identificaties).encode("utf-8")
+    offsets = [0]
+    for identificatie in identificaties:
+        offsets.append(offsets[-1] + len(identificatie.encode("utf-8")))
+    views = [
+        strings,
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        struct.pack(f"<{len(h_nok)}{code}", *h_nok),
+    ]
+    binary, buffer_views = b"", []
+    for view in views:
+        buffer_views.append(
+            {"buffer": 0, "byteOffset": len(binary), "byteLength": len(view)}
+        )
+        binary += view + b"\x00" * (-len(view) % 8)
+    gltf = {
+        "asset": {"version": "2.0"},
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": buffer_views,
+        "extensions": {
+            "EXT_structural_metadata": {
+                "schema": {
+                    "id": "bag3d",
+                    "classes": {
+                        "building": {
+                            "properties": {
+                                "identificatie": {"type": "STRING"},
+                                "b3_h_nok": definition,
+                            }
+                        }
+                    },
+                },
+                "propertyTables": [
+                    {
+                        "class": "building",
+                        "count": len(identificaties),
+                        "properties": {
+                            "identificatie": {"values": 0, "stringOffsets": 1},
+                            "b3_h_nok": {"values": 2, **(overrides or {})},
+                        },
+                    }
+                ],
+            }
+        },
+    }
+    json_chunk = json.dumps(gltf).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, length))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON") + json_chunk)
+        f.write(struct.pack("<I4s", len(binary), b"BIN\x00") + binary)
+
+
+def test_read_glb(tmp_path):
+    """Can we read the property table of a glTF tile?"""
+    write_glb(tmp_path / "0.glb", IDS, [10.25, 11.5])
+    records = list(read_glb(tmp_path / "0.glb", Cesium3dTilesLocation.lod22))
+    assert [r.identificatie for r in records] == IDS
+    assert records[1].attributes["b3_h_nok"] == 11.5
+
+
+def test_read_glb_quantized(tmp_path):
+    """Do we apply the normalized, scale and offset of a quantized property?"""
+    write_glb(
+        tmp_path / "0.glb",
+        IDS,
+        [0, 65535],
+        {"componentType": "UINT16", "normalized": True, "scale": 100.0},
+        {"offset": -10.0},
+    )
+    records = list(read_glb(tmp_path / "0.glb", Cesium3dTilesLocation.lod22))
+    assert [r.attributes["b3_h_nok"] for r in records] == [-10.0, 90.0]
+
+    write_glb(
+        tmp_path / "1.glb", IDS, [1025, 1150], {"componentType": "INT16", "scale": 0.01}
+    )
+    records = list(read_glb(tmp_path / "1.glb", Cesium3dTilesLocation.lod22))
+    assert values_equal(
+        load_attributes_spec()["b3_h_nok"], records[1].attributes["b3_h_nok"], 11.5
+    )
+
+
+def test_read_gpkg(tmp_path, write_gpkg):
+    """Can we read a GeoPackage layer and convert the stored values?"""
+    write_gpkg(tmp_path / "tile.gpkg", {IDS[0]: {"b3_kas_warenhuis": True}})
+    (record,) = read_gpkg(tmp_path / "tile.gpkg", load_attributes_spec())
+    assert record.location == GpkgLocation.pand
+    assert record.attributes["b3_kas_warenhuis"] is True
+    assert "geom" not in record.attributes
+
+
+def test_check_consistency(tmp_path, write_cityjsonseq, write_gpkg):
+    """Do we count the mismatches per attribute and pair of locations?"""
+    write_cityjsonseq(
+        tmp_path / "tile.city.jsonl",
+        {
+            IDS[0]: {
+                "b3_h_nok": 10.2512,
+                "b3_kas_warenhuis": True,
+                "b3_dak_type": "slanted",
+            },
+            IDS[1]: {
+                "b3_h_nok": 11.5,
+                "b3_kas_warenhuis": False,
+                "b3_dak_type": "horizontal",
+            },
+        },
+    )
+    write_gpkg(
+        tmp_path / "tile.gpkg",
+        {
+            IDS[0]: {
+                "b3_h_nok": 10.25,
+                "b3_kas_warenhuis": True,
+                "b3_dak_type": "slanted",
+            },
+            IDS[1]: {
+                "b3_h_nok": 11.5,
+                "b3_kas_warenhuis": False,
+                "b3_dak_type": None,
+            },
+        },
+    )
+    (tmp_path / "lod22").mkdir()
+    write_glb(tmp_path / "lod22" / "0.glb", IDS, [10.25, 12.5])
+
+    report = check_consistency(
+        [
+            Source(tmp_path / "tile.city.jsonl"),
+            Source(tmp_path / "tile.gpkg"),
+            Source(tmp_path / "lod22", Cesium3dTilesLocation.lod22),
+        ],
+        tmp_path / "scratch",
+        n_partitions=4,
+        max_workers=2,
+    )
+
+    cityjson = f"cityjson:{CityJSONLocation.Building}"
+    gpkg = f"gpkg:{GpkgLocation.pand}"
+    tiles = f"cesium3dtiles:{Cesium3dTilesLocation.lod22}"
+    assert report.compared[("b3_h_nok", tiles, cityjson)] == 2
+    assert report.mismatches[("b3_h_nok", cityjson, gpkg)] == 0
+    assert report.mismatches[("b3_h_nok", tiles, cityjson)] == 1
+    assert report.mismatches[("b3_h_nok", tiles, gpkg)] == 1
+    assert report.mismatches[("b3_kas_warenhuis", cityjson, gpkg)] == 0
+    assert report.mismatches[("b3_dak_type", cityjson, gpkg)] == 1
+    assert report.examples[("b3_dak_type", cityjson, gpkg)] == [
+        (IDS[1], "horizontal", None)
+    ]
+
+
+def test_values_equal():
+    """Do we tolerate rounding and float32 storage, but report one unit of precision?"""
+    h_nok = load_attributes_spec()["b3_h_nok"]
+    assert values_equal(h_nok, 10.2512, 10.25)
+    assert values_equal(h_nok, 10.2549, 10.2551)
+    assert not values_equal(h_nok, 10.25, 10.26)
+    assert not values_equal(h_nok, None, 10.25)
+
+    volume = load_attributes_spec()["b3_volume_lod22"]
+    (float32,) = struct.unpack("<f", struct.pack("<f", 1234567.89))
+    assert values_equal(volume, 1234567.89, float32)
+    assert not values_equal(volume, 1234567.89, 1234567.99)
@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import json
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bag3d.specs.fetch import Tile, fetch_and_validate, read_tile_index
+
+
+def write_tile(path, dak_type):
+    cityjson = {
+        "type": "CityJSON",
+        "version": "2.0",
+        "CityObjects": {
+            "NL.IMBAG.Pand.0503100000000001": {
+                "type": "Building",
+                "attributes": {
+                    "identificatie": "NL.IMBAG.Pand.0503100000000001",
+                    "b3_dak_type": dak_type,
+                    "b3_h_maaiveld": 1.2,
+                },
+                "children": ["NL.IMBAG.Pand.0503100000000001-0"],
+            },
+            "NL.IMBAG.Pand.0503100000000001-0": {
+                "type": "BuildingPart",
+                "attributes": {},
+                "parents": ["NL.IMBAG.Pand.0503100000000001"],
+            },
+        },
+        "vertices": [],
+    }
+    path.write_text(json.dumps(cityjson), encoding="utf-8")
+
+
+@pytest.fixture
+def tiles_dir(tmp_path):
+    tiles = tmp_path / "tiles"
+    tiles.mkdir()
+    write_tile(tiles / "9-0-0.city.json", "slanted")
+    write_tile(tiles / "9-0-1.city.json", "flat")
+    index = tmp_path / "tile_index.csv"
+    index.write_text(
+        "tile_id,cj_download\n"
+        "9/0/0,9-0-0.city.json\n"
+        "9/0/1,9-0-1.city.json\n"
+        "9/0/2,9-0-2.city.json\n",
+        encoding="utf-8",
+    )
+    return tiles, index
+
+
+def test_fetch_and_validate_directory(tiles_dir, tmp_path):
+    """Can we validate the tiles of a tile index in a local directory?"""
+    tiles, index = tiles_dir
+    report = asyncio.run(
+        fetch_and_validate(
+            read_tile_index(index, base=str(tiles)),
+            tmp_path / "scratch",
+            max_workers=2,
+        )
+    )
+    results = {r.tile.tile_id: r for r in report.results}
+    assert results["9/0/0"].is_valid
+    assert "b3_dak_type" in results["9/0/1"].errors[0]
+    assert results["9/0/2"].failure is not None
+    assert (report.n_valid, report.n_invalid, report.n_failed) == (1, 1, 1)
+    assert report.tiles_per_second > 0
+
+
+def test_fetch_and_validate_callback(tiles_dir, tmp_path):
+    """Are the results only counted when they are passed to a callback?"""
+    tiles, index = tiles_dir
+    finished = []
+    report = asyncio.run(
+        fetch_and_validate(
+            read_tile_index(index, base=str(tiles)),
+            tmp_path / "scratch",
+            max_workers=2,
+            max_errors=0,
+            on_result=finished.append,
+        )
+    )
+    assert report.results == []
+    assert (report.n_valid, report.n_invalid, report.n_failed) == (1, 1, 1)
+    invalid = next(r for r in finished if r.tile.tile_id == "9/0/1")
+    assert invalid.errors == [] and invalid.n_errors == 1
+    assert not invalid.is_valid
+
+
+def test_fetch_and_validate_http(tiles_dir, tmp_path):
+    """Can we fetch and validate the tiles from an HTTP server?"""
+    tiles, index = tiles_dir
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(tiles))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}/"
+        scratch = tmp_path / "scratch"
+        report = asyncio.run(
+            fetch_and_validate(
+                read_tile_index(index, base=base),
+                scratch,
+                max_connections=2,
+                max_workers=1,
+                max_pending=1,
+                backoff=0.01,
+            )
+        )
+    finally:
+        server.shutdown()
+    results = {r.tile.tile_id: r for r in report.results}
+    assert results["9/0/0"].is_valid
+    assert not results["9/0/1"].is_valid
+    assert "404" in results["9/0/2"].failure
+    assert list(scratch.iterdir()) == []
+
+
+def test_fetch_and_validate_retries(tmp_path):
+    """Do we give up on a tile after the retries are exhausted?"""
+    tile = Tile("9/0/0", "http://127.0.0.1:1/9-0-0.city.json")
+    report = asyncio.run(
+        fetch_and_validate([tile], tmp_path, max_workers=1, retries=2, backoff=0.01)
+    )
+    assert report.n_failed == 1
@@ -0,0 +1,15 @@
+from bag3d.specs.core import load_attributes_spec
+from bag3d.specs.validation import check_value
+
+
+def test_check_value_format():
+    """Do we check that the dates and datetimes match their value format?"""
+    spec = load_attributes_spec()
+    assert check_value(spec["begingeldigheid"], "2010-10-21") == []
+    assert check_value(spec["begingeldigheid"], "not a date")
+    assert check_value(spec["begingeldigheid"], "2010-02-30")
+    assert check_value(spec["b3_pw_datum"], "2022") == []
+    assert check_value(spec["b3_pw_datum"], "2022-05")
+    assert check_value(spec["tijdstipregistratie"], "2010-10-21T10:19:31.000") == []
+    assert check_value(spec["tijdstipregistratie"], "2010-10-21T10:19:31.000Z") == []
+    assert check_value(spec["tijdstipregistratie"], "yesterday")